@@ -0,0 +1,285 @@
+"""
+Local analytics over daily offer snapshots (without DWH). Loads date range of
+columnar snapshots (or CSVs if there is no snapshot for given day) into numpy
+arrays and computes metrics from reports.sql plus price per m2 percentiles and
+time on market. Can be used to cross-check results of SQL path, e.g.:
+
+    python analytics.py --start 2019-11-01 --end 2019-11-30
+"""
+# built-in
+import argparse
+import csv
+import datetime
+import os
+
+# custom
+import columnar
+import otodom
+
+# 3rd party
+import numpy as np
+
+
+# same cities as in reports.sql (as ascii slugs)
+REPORT_CITIES = [
+    'bydgoszcz', 'gdansk', 'katowice', 'krakow', 'lublin', 'lodz', 'poznan',
+    'szczecin', 'warszawa', 'wroclaw',
+]
+AREA_EDGES = [38, 60, 90]
+AREA_CATEGORIES = ['0-38', '38-60', '60-90']
+# city is taken from offer_location_raw through scraper's gazetteer (as city_slug)
+COLUMNS = ['offer_source_id', 'offer_type', 'offer_location_raw', 'price', 'area']
+PERCENTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+
+class Encoder(object):
+    """Maps strings into global integer codes (shared across days)"""
+    def __init__(self, normalize=None):
+        self.normalize = normalize
+        self.codes = {}
+        self.values = []
+
+    def encode(self, values, local_codes):
+        """
+        Translates dictionary encoded column (`values` + `local_codes`, -1 for
+        null) into global codes. Only distinct values are looked up in python.
+        """
+        mapping = np.empty(len(values) + 1, dtype=np.int64)
+        for idx, v in enumerate(values):
+            if self.normalize:
+                v = self.normalize(v)
+            code = self.codes.get(v)
+            if code is None:
+                code = self.codes[v] = len(self.values)
+                self.values.append(v)
+            mapping[idx] = code
+        mapping[-1] = -1  # local null code (-1) points to last element
+        return mapping[local_codes]
+
+
+def _date_range(start_ds, end_ds):
+    start = datetime.date.fromisoformat(start_ds)
+    end = datetime.date.fromisoformat(end_ds)
+    return [start + datetime.timedelta(days=d) for d in range((end - start).days + 1)]
+
+
+def _bytes_array(offsets, blob):
+    """
+    Builds fixed width bytes array out of utf8 `blob` split by `offsets`
+    without decoding every value in python
+    """
+    offsets = np.frombuffer(offsets, dtype=np.uint32).astype(np.int64)
+    lengths = np.diff(offsets)
+    width = max(int(lengths.max()) if len(lengths) else 0, 1)
+    matrix = np.zeros((len(lengths), width), dtype=np.uint8)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    cols = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+    matrix[rows, cols] = np.frombuffer(blob, dtype=np.uint8)
+    return matrix.view(f'S{width}').ravel()
+
+
+def _read_day_columnar(scraper, ds):
+    # numeric columns are kept until all days are loaded, so read them without
+    # mmap (each mmapped column would hold an open fd)
+    cols = scraper.read_offers(ds, COLUMNS, use_mmap=False)
+    out = {}
+    for name, col in cols.items():
+        if name == 'offer_source_id':
+            # only compared, so no need for decoding. nulls become b''
+            values = np.append(_bytes_array(col.offsets, col.blob), b'')
+            out[name] = values[np.frombuffer(col.codes, dtype=np.int32)]
+        elif isinstance(col, columnar.StringColumn):
+            out[name] = (col.values, np.frombuffer(col.codes, dtype=np.int32))
+        else:
+            out[name] = np.frombuffer(col, dtype=np.float64)
+    return out
+
+
+def _read_day_csv(scraper, ds):
+    file_name = scraper.get_full_file_name(ds)
+    # first 2 columns are ds and scraper id
+    idx = {name: scraper.filed_names.index(name) + 2 for name in COLUMNS}
+    strings = {name: ({}, []) for name in ('offer_type', 'offer_location_raw')}
+    numbers = {'price': [], 'area': []}
+    ids = []
+    with open(file_name, 'r', encoding='utf8') as fh:
+        for row in csv.reader(fh):
+            ids.append(row[idx['offer_source_id']].encode('utf8'))
+            for name, (lookup, codes) in strings.items():
+                v = row[idx[name]]
+                codes.append(lookup.setdefault(v, len(lookup)) if v != '' else -1)
+            for name, values in numbers.items():
+                v = row[idx[name]]
+                values.append(float(v) if v != '' else np.nan)
+    out = {
+        name: (list(lookup), np.array(codes, dtype=np.int32))
+        for name, (lookup, codes) in strings.items()
+    }
+    for name, values in numbers.items():
+        out[name] = np.array(values, dtype=np.float64)
+    out['offer_source_id'] = np.array(ids, dtype=np.bytes_)
+    return out
+
+
+def load_offers(scraper, start_ds, end_ds):
+    """
+    Loads all days between `start_ds` and `end_ds` (inclusive) into dict of
+    numpy arrays (one row per offer per day). `offer_source_id` is bytes array,
+    `offer_type` and `city` (slug of city resolved by `scraper.gazetteer`) are
+    integer codes with distinct values in returned encoders. `day` is no of
+    days since start.
+    """
+    encoders = {
+        'offer_type': Encoder(),
+        'city': Encoder(normalize=lambda loc_raw: scraper.gazetteer.lookup(loc_raw).city_slug),
+    }
+    sources = {'offer_type': 'offer_type', 'city': 'offer_location_raw'}
+    parts = {name: [] for name in ['offer_source_id', 'offer_type', 'city', 'price', 'area', 'day']}
+    for day, date in enumerate(_date_range(start_ds, end_ds)):
+        ds = date.strftime('%Y-%m-%d')
+        if os.path.exists(scraper.get_columnar_dir_name(ds)):
+            cols = _read_day_columnar(scraper, ds)
+        elif os.path.exists(scraper.get_full_file_name(ds)):
+            cols = _read_day_csv(scraper, ds)
+        else:
+            continue
+        for name, encoder in encoders.items():
+            parts[name].append(encoder.encode(*cols[sources[name]]))
+        parts['offer_source_id'].append(cols['offer_source_id'])
+        parts['price'].append(cols['price'])
+        parts['area'].append(cols['area'])
+        parts['day'].append(np.full(len(cols['price']), day, dtype=np.int32))
+    offers = {
+        name: np.concatenate(arrays) if arrays else np.empty(0)
+        for name, arrays in parts.items()
+    }
+    scraper.gazetteer.save()
+    return offers, encoders
+
+
+def latest_per_offer(offers):
+    """
+    Collapses observations into one row per offer: columns from last day it was
+    seen (same as latest SCD2 version in DWH) plus `first_seen` and `last_seen`
+    days (within loaded range).
+    """
+    order = np.lexsort((offers['day'], offers['offer_source_id']))
+    ids = offers['offer_source_id'][order]
+    is_last = np.ones(len(ids), dtype=bool)
+    is_last[:-1] = ids[1:] != ids[:-1]
+    is_first = np.ones(len(ids), dtype=bool)
+    is_first[1:] = ids[1:] != ids[:-1]
+    last_idx = order[is_last]
+    out = {name: values[last_idx] for name, values in offers.items()}
+    out['first_seen'] = offers['day'][order[is_first]]
+    out['last_seen'] = out['day']
+    return out
+
+
+def _filter(latest, encoders, offer_type, cities):
+    type_code = encoders['offer_type'].codes.get(offer_type, -2)
+    city_codes = [encoders['city'].codes[c] for c in cities if c in encoders['city'].codes]
+    mask = (latest['offer_type'] == type_code) & np.isin(latest['city'], city_codes)
+    return {name: values[mask] for name, values in latest.items()}
+
+
+def _group_percentiles(keys, values, qs):
+    """
+    Linear interpolated percentiles of `values` within groups of `keys`.
+    Returns (unique keys, counts, array of shape [len(unique keys), len(qs)])
+    """
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    uniq, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    pos = starts[:, None] + (counts[:, None] - 1) * np.asarray(qs)[None, :]
+    lower = np.floor(pos).astype(np.int64)
+    upper = np.ceil(pos).astype(np.int64)
+    frac = pos - lower
+    return uniq, counts, values[lower] * (1 - frac) + values[upper] * frac
+
+
+def price_report(latest):
+    """
+    Same as reports.sql: no of offers and max/min/avg price by city and area
+    category. Offers above largest area category are skipped.
+    """
+    bucket = np.searchsorted(AREA_EDGES, latest['area'], side='left')
+    mask = bucket < len(AREA_EDGES)
+    keys = latest['city'][mask] * len(AREA_EDGES) + bucket[mask]
+    prices = latest['price'][mask]
+    order = np.argsort(keys, kind='stable')
+    keys, prices = keys[order], prices[order]
+    uniq, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    if len(uniq) == 0:
+        return []
+    max_price = np.maximum.reduceat(prices, starts)
+    min_price = np.minimum.reduceat(prices, starts)
+    avg_price = np.add.reduceat(prices, starts) / counts
+    return [
+        (
+            int(k // len(AREA_EDGES)), AREA_CATEGORIES[k % len(AREA_EDGES)],
+            int(n), float(mx), float(mn), float(np.floor(avg + 0.5)),
+        )
+        for k, n, mx, mn, avg in zip(uniq, counts, max_price, min_price, avg_price)
+    ]
+
+
+def price_per_m2_report(latest, qs=PERCENTILES):
+    """Percentiles of price per m2 by city"""
+    mask = latest['area'] > 0
+    ppm2 = latest['price'][mask] / latest['area'][mask]
+    cities, counts, values = _group_percentiles(latest['city'][mask], ppm2, qs)
+    return [
+        (int(c), int(n), *[float(np.round(v)) for v in row])
+        for c, n, row in zip(cities, counts, values)
+    ]
+
+
+def time_on_market_report(latest):
+    """
+    Days between first and last seen (inclusive) by city. Offers seen before
+    start of loaded range are counted from start of range.
+    """
+    days = (latest['last_seen'] - latest['first_seen'] + 1).astype(np.float64)
+    cities, counts, values = _group_percentiles(latest['city'], days, [0.5, 1.0])
+    sums = np.bincount(np.searchsorted(cities, latest['city']), weights=days, minlength=len(cities))
+    return [
+        (int(c), int(n), round(float(s / n), 1), float(median), float(mx))
+        for c, n, s, (median, mx) in zip(cities, counts, sums, values)
+    ]
+
+
+def _print_table(header, rows, city_names):
+    print(' | '.join(header))
+    for row in rows:
+        print(' | '.join(str(v) for v in (city_names[row[0]],) + tuple(row[1:])))
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--start', required=True, help='Date in formar YYYY-MM-DD')
+    parser.add_argument('--end', required=True, help='Date in formar YYYY-MM-DD')
+    parser.add_argument('--offer-type', default='rent')
+    parser.add_argument('--cities', nargs='+', default=REPORT_CITIES)
+    args = parser.parse_args()
+
+    offers, encoders = load_offers(otodom.OtoDom(), args.start, args.end)
+    latest = _filter(latest_per_offer(offers), encoders, args.offer_type, args.cities)
+    city_names = encoders['city'].values
+    _print_table(
+        ['city', 'area_category', 'no_offers', 'max_price', 'min_price', 'avg_price'],
+        price_report(latest), city_names,
+    )
+    _print_table(
+        ['city', 'no_offers'] + [f'ppm2_p{int(q * 100)}' for q in PERCENTILES],
+        price_per_m2_report(latest), city_names,
+    )
+    _print_table(
+        ['city', 'no_offers', 'avg_days', 'median_days', 'max_days'],
+        time_on_market_report(latest), city_names,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+End-to-end crawl benchmark. Runs OtoDom.scrape against local stand-in server
+(otodom_standin.py) with no sleeps and reports throughput, peak RSS and
+request counts. Use it to compare crawl path changes offline, e.g.:
+
+    python bench_crawl.py --cities 5 --page-count 10 --latency 0.05 --throttle-rate 0.02
+"""
+# built-in
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import urllib.request
+
+# custom
+import otodom
+import otodom_standin
+
+
+LISTING_TYPES = ['wynajem/mieszkanie', 'sprzedaz/mieszkanie', 'sprzedaz/nowe-mieszkanie']
+
+
+def peak_rss_mb():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return max_rss / 1024 / 1024  # bytes on macOS
+    return max_rss / 1024  # kilobytes on linux
+
+
+def get_server_stats(base_url):
+    with urllib.request.urlopen(f'{base_url}/__stats') as r:
+        return json.loads(r.read())
+
+
+def write_locations_file(file_name, base_url, cities):
+    with open(file_name, 'w') as fh:
+        for city in cities:
+            for listing_type in LISTING_TYPES:
+                fh.write(f'{base_url}/{listing_type}/{city}/\n')
+
+
+def run(args):
+    options = otodom_standin.StandInOptions(
+        latency=args.latency,
+        page_count=args.page_count,
+        offers_per_page=args.offers_per_page,
+        extra_links=args.extra_links,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    )
+    process, base_url = otodom_standin.start_in_process(options)
+    # per page debug logging would dominate measurements
+    otodom.logger.setLevel(logging.WARNING)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            locations_file = os.path.join(tmp_dir, 'locations.txt')
+            cities = sorted(otodom.OtoDom(file_path=tmp_dir).selected_cities)[:args.cities]
+            write_locations_file(locations_file, base_url, cities)
+            s = otodom.OtoDom(
+                base_url=base_url,
+                locations_file=locations_file,
+                sleep_range=(0, 0),
+                file_path=tmp_dir,
+            )
+            start = time.perf_counter()
+            offers = s.scrape(limit_pages=args.limit_pages, filter_cities=not args.all_listings)
+            elapsed = time.perf_counter() - start
+        server_stats = get_server_stats(base_url)
+    finally:
+        process.terminate()
+        process.join()
+
+    # listing pages offers were parsed from. requests include also page count
+    # checks, extra listing fetches and retries
+    pages = s.listing_pages_count
+    requests = server_stats.get('requests', 0)
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'listing_pages': pages,
+        'requests': requests,
+        'offers': len(offers),
+        'pages_per_s': round(pages / elapsed, 2),
+        'requests_per_s': round(requests / elapsed, 2),
+        'offers_per_s': round(len(offers) / elapsed, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'server_requests': server_stats,
+        'client_requests': {str(k): v for k, v in s.requests_stats.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cities', type=int, default=3, help='No of selected cities in base listings')
+    parser.add_argument('--page-count', type=int, default=5, help='No of pages per listing')
+    parser.add_argument('--offers-per-page', type=int, default=72)
+    parser.add_argument('--extra-links', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added by server to every response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 500 responses')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of 429 responses')
+    parser.add_argument('--limit-pages', type=int, default=None)
+    parser.add_argument('--all-listings', action='store_true', help='Crawl also extra (district) listings')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Append results as json line to this file')
+    args = parser.parse_args()
+
+    results = run(args)
+    for k, v in results.items():
+        print(f'{k:>16}: {v}')
+    if args.output:
+        with open(args.output, 'a') as fh:
+            fh.write(json.dumps({'args': vars(args), 'results': results}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""
+Benchmark of dwh_offers.sql merge. Creates dwh_ddl.sql schema in throwaway
+local Postgres cluster (initdb/pg_ctl have to be on PATH or in --pg-bin),
+generates synthetic daily snapshots with configurable churn and replays them
+through etl.load_to_stg and etl.load_to_dwh. For every day it records timing
+and EXPLAIN (ANALYZE, BUFFERS) plan of each merge statement, e.g.:
+
+    python bench_dwh_merge.py --days 365 --offers 20000 --output merge_bench.jsonl
+"""
+# built-in
+import argparse
+import contextlib
+import datetime
+import getpass
+import io
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+# custom
+import config
+import etl
+import scraper
+
+# 3rd party
+import psycopg2
+
+
+EXPLAINABLE = ('INSERT', 'UPDATE', 'DELETE', 'SELECT', 'WITH')
+CITIES = [
+    ('Warszawa', ['Mokotów', 'Wola', 'Śródmieście', 'Praga-Południe']),
+    ('Kraków', ['Podgórze', 'Krowodrza', 'Stare Miasto']),
+    ('Wrocław', ['Psie Pole', 'Fabryczna', 'Krzyki']),
+    ('Gdańsk', ['Wrzeszcz', 'Jelitkowo', 'Oliwa']),
+    ('Poznań', ['Jeżyce', 'Grunwald', 'Wilda']),
+]
+
+
+class ThrowawayPostgres(object):
+    """
+    Local Postgres cluster in temporary directory, listening on unix socket
+    only. Removed on exit unless `keep` is set.
+    """
+    def __init__(self, pg_bin=None, port=5432, keep=False):
+        self.pg_bin = pg_bin
+        self.port = port
+        self.keep = keep
+        self.tmp_dir = None
+
+    def _bin(self, name):
+        return os.path.join(self.pg_bin, name) if self.pg_bin else name
+
+    def __enter__(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='dwh_merge_bench_')
+        data_dir = os.path.join(self.tmp_dir, 'data')
+        try:
+            subprocess.run(
+                [self._bin('initdb'), '-D', data_dir, '-U', getpass.getuser(),
+                 '--auth=trust', '--encoding=UTF8', '--no-locale'],
+                check=True, stdout=subprocess.DEVNULL,
+            )
+            subprocess.run(
+                [self._bin('pg_ctl'), '-D', data_dir, '-l', os.path.join(self.tmp_dir, 'postgres.log'),
+                 '-o', f"-p {self.port} -k {self.tmp_dir} -c listen_addresses=''", '-w', 'start'],
+                check=True, stdout=subprocess.DEVNULL,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            # __exit__ is not called when __enter__ fails
+            shutil.rmtree(self.tmp_dir)
+            raise
+        return {
+            'user': getpass.getuser(),
+            'host': self.tmp_dir,  # unix socket directory
+            'dbname': 'postgres',
+            'port': self.port,
+            'options': '-c search_path=dwh',
+        }
+
+    def __exit__(self, *exc):
+        subprocess.run(
+            [self._bin('pg_ctl'), '-D', os.path.join(self.tmp_dir, 'data'), '-m', 'fast', 'stop'],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        if self.keep:
+            print(f'Kept cluster in {self.tmp_dir}')
+        else:
+            shutil.rmtree(self.tmp_dir)
+
+
+class SyntheticScraper(scraper.Scraper):
+    """Only stores generated offers. Uses otodom id to fit stg/wrk tables"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.scraper_id = 'otodom'
+        self.storage_formats = ['csv']  # COPY into stg needs CSV
+
+    def scrape(self):
+        return []
+
+
+def split_statements(sql):
+    """
+    Splits SQL script into list of (label, statement). Label is the comment
+    line preceding the statement.
+    """
+    sql = re.sub(r'/\*.*?\*/', '', sql, flags=re.S)
+    statements = []
+    label = None
+    lines = []
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if not lines:
+            if not stripped:
+                continue
+            if stripped.startswith('--'):
+                label = stripped.lstrip('- ')
+                continue
+        lines.append(line)
+        if stripped.endswith(';'):
+            statement = '\n'.join(lines).strip().rstrip(';')
+            statements.append((label or statement.split()[0], statement))
+            label = None
+            lines = []
+    return statements
+
+
+class MergeProfiler(object):
+    """
+    Drop-in replacement of `etl.query_dwh` for `etl.load_to_dwh`. Runs merge
+    script statement by statement (in single transaction, as query_dwh does)
+    with EXPLAIN (ANALYZE, BUFFERS) where possible and records timings.
+    """
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, query, output=False):
+        with psycopg2.connect(**config.DWH_CONN_SETTINGS) as conn:
+            cur = conn.cursor()
+            if output:
+                cur.execute(query)
+                return cur.fetchall()
+            for label, statement in split_statements(query):
+                record = {'label': label}
+                start = time.perf_counter()
+                if statement.split()[0].upper() in EXPLAINABLE:
+                    cur.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}')
+                    plan = cur.fetchone()[0][0]
+                    record['execution_ms'] = plan['Execution Time']
+                    record['planning_ms'] = plan['Planning Time']
+                    record['shared_hit_blocks'] = plan['Plan'].get('Shared Hit Blocks')
+                    record['shared_read_blocks'] = plan['Plan'].get('Shared Read Blocks')
+                    record['plan'] = plan
+                else:
+                    cur.execute(statement)
+                record['seconds'] = round(time.perf_counter() - start, 4)
+                self.statements.append(record)
+
+
+def generate_days(start_ds, days, no_offers, churn, price_change_rate, seed=0):
+    """
+    Yields (ds, offers) for consecutive days. Each day `churn` fraction of
+    offers disappears and is replaced with new ones, `price_change_rate`
+    fraction of remaining ones gets new price (new SCD2 version in DWH).
+    """
+    rng = random.Random(seed)
+    active = {}
+    next_id = 0
+    start = datetime.date.fromisoformat(start_ds)
+    for day in range(days):
+        for offer_id in list(active):
+            if rng.random() < churn:
+                del active[offer_id]
+            elif rng.random() < price_change_rate:
+                active[offer_id]['price'] = round(active[offer_id]['price'] * rng.uniform(0.9, 1.1), 2)
+        while len(active) < no_offers:
+            offer_source_id = f'syn{next_id}'
+            next_id += 1
+            city, districts = rng.choice(CITIES)
+            district = rng.choice(districts)
+            offer_type = rng.choice(['rent', 'sell', 'sell_new'])
+            active[offer_source_id] = {
+                'offer_source_id': offer_source_id,
+                'offer_type': offer_type,
+                'offer_title': f'Mieszkanie {offer_source_id}',
+                'offer_url': f'https://www.otodom.pl/oferta/{offer_source_id}.html',
+                'offer_location_raw': f'{city}, {district}',
+                'province': None,
+                'county': None,
+                'city': city.lower(),
+                'district': district.lower(),
+                'neighbourhood': None,
+                'no_rooms': rng.randint(1, 5),
+                'price': float(rng.randint(1500, 6000) if offer_type == 'rent' else rng.randint(200000, 1500000)),
+                'area': round(rng.uniform(18, 140), 2),
+                'offer_source': rng.choice(['Oferta prywatna', 'Biuro nieruchomości']),
+            }
+        ds = (start + datetime.timedelta(days=day)).strftime('%Y-%m-%d')
+        yield ds, list(active.values())
+
+
+def count_rows(table):
+    return etl.query_dwh(f'SELECT COUNT(1) FROM {table};', output=True)[0][0]
+
+
+def replay(args, files_dir, output_fh):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dwh_ddl.sql'), 'r') as fh:
+        ddl = fh.read()
+    with contextlib.redirect_stdout(io.StringIO()):
+        etl.query_dwh(ddl)
+    days = generate_days(args.start_ds, args.days, args.offers, args.churn, args.price_change_rate, args.seed)
+    for ds, offers in days:
+        s = SyntheticScraper(ds=ds, file_path=files_dir)
+        s.store_offers(offers)
+        profiler = MergeProfiler()
+        # query_dwh prints every query, keep only bench output
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            etl.load_to_stg([s], ds)
+            stg_load_s = time.perf_counter() - start
+            start = time.perf_counter()
+            etl.load_to_dwh([s], ds, run_query=profiler)
+            dwh_load_s = time.perf_counter() - start
+            offers_rows = count_rows('offers')
+            stg_rows = count_rows(f'stg_{s.scraper_id}')
+        os.remove(s.get_full_file_name(ds))
+        record = {
+            'ds': ds,
+            'snapshot_rows': len(offers),
+            'stg_rows': stg_rows,
+            'offers_rows': offers_rows,
+            'stg_load_s': round(stg_load_s, 4),
+            'dwh_load_s': round(dwh_load_s, 4),
+            'statements': profiler.statements,
+        }
+        if output_fh:
+            output_fh.write(json.dumps(record) + '\n')
+        slowest = max(profiler.statements, key=lambda r: r['seconds'])
+        print(
+            f'{ds} offers: {offers_rows:>10} stg: {stg_load_s:7.3f}s dwh: {dwh_load_s:7.3f}s '
+            f'slowest: {slowest["label"]} ({slowest["seconds"]:.3f}s)'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=30, help='No of daily snapshots to replay')
+    parser.add_argument('--offers', type=int, default=20000, help='No of active offers per day')
+    parser.add_argument('--churn', type=float, default=0.03, help='Fraction of offers replaced every day')
+    parser.add_argument('--price-change-rate', type=float, default=0.01, help='Fraction of offers with new price every day')
+    parser.add_argument('--start-ds', default='2019-01-01')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pg-bin', help='Directory with initdb and pg_ctl')
+    parser.add_argument('--keep-cluster', action='store_true')
+    parser.add_argument('--output', help='Write per day timings and plans as json lines to this file')
+    args = parser.parse_args()
+
+    with ThrowawayPostgres(pg_bin=args.pg_bin, keep=args.keep_cluster) as conn_settings:
+        config.DWH_CONN_SETTINGS = conn_settings
+        # merge script is read from config.ETL_SQL_PATH
+        config.ETL_SQL_PATH = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as files_dir:
+            os.chmod(files_dir, 0o755)  # server side COPY reads the files
+            output_fh = open(args.output, 'w') if args.output else None
+            try:
+                replay(args, files_dir, output_fh)
+            finally:
+                if output_fh:
+                    output_fh.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Stdlib only columnar storage for daily offer snapshots.
+
+Snapshot is a directory with `meta.json` and one file per schema column:
+- integer: raw native int64 array, nulls stored as INT_NULL. can be mmapped
+- decimal: raw native float64 array, nulls stored as NaN. can be mmapped
+- varchar: zlib compressed dictionary encoding. offsets of distinct values
+  (uint32), their utf8 blob and int32 codes per row (-1 for null)
+"""
+# built-in
+from array import array
+import json
+import math
+import mmap
+import os
+import shutil
+import sys
+import zlib
+
+
+INT_NULL = -2**63
+META_FILE_NAME = 'meta.json'
+TYPECODES = {
+    'integer': 'q',
+    'decimal': 'd',
+}
+
+
+class UnknownColumnType(Exception):
+    pass
+
+
+class StringColumn(object):
+    """
+    Dictionary encoded varchar column. `values` are distinct strings (decoded
+    from `blob` and `offsets` on first access) and `codes` are
+    row -> index into `values` (-1 for null).
+    """
+    def __init__(self, offsets, blob, codes):
+        self.offsets = offsets
+        self.blob = blob
+        self.codes = codes
+        self._values = None
+
+    @property
+    def values(self):
+        if self._values is None:
+            offsets, blob = self.offsets, self.blob
+            self._values = [
+                blob[offsets[i]:offsets[i+1]].decode('utf8')
+                for i in range(len(offsets) - 1)
+            ]
+        return self._values
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, idx):
+        code = self.codes[idx]
+        return self.values[code] if code >= 0 else None
+
+    def __iter__(self):
+        values = self.values
+        for code in self.codes:
+            yield values[code] if code >= 0 else None
+
+    def to_list(self):
+        return list(self)
+
+
+def _encode_varchar(values):
+    lookup = {}
+    codes = array('i')
+    for v in values:
+        if v is None:
+            codes.append(-1)
+        else:
+            codes.append(lookup.setdefault(v, len(lookup)))
+    blobs = [v.encode('utf8') for v in lookup]
+    offsets = array('I', [0])
+    for b in blobs:
+        offsets.append(offsets[-1] + len(b))
+    payload = offsets.tobytes() + b''.join(blobs) + codes.tobytes()
+    return zlib.compress(payload), {'n_values': len(blobs), 'blob_size': offsets[-1]}
+
+
+def _decode_varchar(data, col_meta, swap):
+    payload = zlib.decompress(data)
+    offsets = array('I')
+    offsets_size = (col_meta['n_values'] + 1) * offsets.itemsize
+    offsets.frombytes(payload[:offsets_size])
+    blob_end = offsets_size + col_meta['blob_size']
+    codes = array('i')
+    codes.frombytes(payload[blob_end:])
+    if swap:
+        offsets.byteswap()
+        codes.byteswap()
+    return StringColumn(offsets, payload[offsets_size:blob_end], codes)
+
+
+def _to_number(value, _type):
+    if value is None or value == '':
+        return INT_NULL if _type == 'integer' else math.nan
+    return int(value) if _type == 'integer' else float(value)
+
+
+def write_snapshot(dir_name, schema, offers, meta=None):
+    """
+    Writes `offers` (list of dicts) as columnar snapshot. `schema` is list of
+    (column name, type) as in `Scraper.schema`. Extra `meta` is stored as is.
+    """
+    tmp_dir_name = f'{dir_name}.tmp'
+    if os.path.exists(tmp_dir_name):
+        shutil.rmtree(tmp_dir_name)
+    os.makedirs(tmp_dir_name)
+    columns = []
+    for name, _type in schema:
+        values = [offer.get(name) for offer in offers]
+        col_meta = {'name': name, 'type': _type, 'file': f'{name}.bin'}
+        if _type == 'varchar':
+            data, encoding_meta = _encode_varchar(
+                [str(v) if v is not None else None for v in values]
+            )
+            col_meta.update(encoding_meta)
+        elif _type in TYPECODES:
+            data = array(
+                TYPECODES[_type], [_to_number(v, _type) for v in values]
+            ).tobytes()
+        else:
+            raise UnknownColumnType(f'{_type} is not supported in columnar snapshot')
+        with open(os.path.join(tmp_dir_name, col_meta['file']), 'wb') as fh:
+            fh.write(data)
+        columns.append(col_meta)
+    with open(os.path.join(tmp_dir_name, META_FILE_NAME), 'w', encoding='utf8') as fh:
+        json.dump({
+            **(meta or {}),
+            'rows': len(offers),
+            'byteorder': sys.byteorder,
+            'columns': columns,
+        }, fh)
+    if os.path.exists(dir_name):
+        shutil.rmtree(dir_name)
+    os.rename(tmp_dir_name, dir_name)
+
+
+def read_meta(dir_name):
+    with open(os.path.join(dir_name, META_FILE_NAME), 'r', encoding='utf8') as fh:
+        return json.load(fh)
+
+
+def _read_numeric(file_name, typecode, rows, use_mmap, swap):
+    if use_mmap and rows > 0 and not swap:
+        with open(file_name, 'rb') as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        # memoryview keeps mmap (and its dup'd fd) alive for as long as column is referenced
+        return memoryview(mm).cast(typecode)
+    values = array(typecode)
+    with open(file_name, 'rb') as fh:
+        values.frombytes(fh.read())
+    if swap:
+        values.byteswap()
+    return values
+
+
+def read_snapshot(dir_name, columns=None, use_mmap=True):
+    """
+    Reads selected `columns` (all if None) of snapshot. Returns dict of
+    column name -> column. Numeric columns are memoryviews over mmapped files
+    (or arrays if `use_mmap` is False), varchar ones are `StringColumn`.
+
+    Every mmapped column holds an open file descriptor until the memoryview
+    (and anything created on top of it without copying, e.g. np.frombuffer)
+    is released. When columns of many snapshots are kept, use
+    `use_mmap=False` or copy them, to not run out of file descriptors.
+    """
+    meta = read_meta(dir_name)
+    swap = meta['byteorder'] != sys.byteorder
+    cols_meta = {c['name']: c for c in meta['columns']}
+    if columns is None:
+        columns = list(cols_meta)
+    out = {}
+    for name in columns:
+        col_meta = cols_meta[name]
+        file_name = os.path.join(dir_name, col_meta['file'])
+        if col_meta['type'] == 'varchar':
+            with open(file_name, 'rb') as fh:
+                out[name] = _decode_varchar(fh.read(), col_meta, swap)
+        else:
+            out[name] = _read_numeric(
+                file_name, TYPECODES[col_meta['type']], meta['rows'], use_mmap, swap
+            )
+    return out
+
+
+def iter_rows(dir_name):
+    """Yields snapshot rows as dicts, with nulls as None (as in scraped offers)"""
+    meta = read_meta(dir_name)
+    cols = read_snapshot(dir_name, use_mmap=False)
+    types = {c['name']: c['type'] for c in meta['columns']}
+    for idx in range(meta['rows']):
+        row = {}
+        for name, col in cols.items():
+            value = col[idx]
+            if types[name] == 'integer' and value == INT_NULL:
+                value = None
+            elif types[name] == 'decimal' and math.isnan(value):
+                value = None
+            row[name] = value
+        yield row
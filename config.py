@@ -1,2 +1,11 @@
 OFFERS_FILE_PATH = '/Users/slaw/osobiste/nieruchom/data'
-ETL_SQL_PATH = '/Users/slaw/osobiste/nieruchom/'
\ No newline at end of file
+ETL_SQL_PATH = '/Users/slaw/osobiste/nieruchom/'
+DWH_CONN_SETTINGS = {
+    'user': 'slaw',
+    'host': 'localhost',
+    'dbname': 'postgres',
+    'port': 5432,
+    'options': '-c search_path=dwh',  # schema
+}
+# formats written by Scraper.store_offers. 'csv' and/or 'columnar'
+OFFERS_STORAGE_FORMATS = ['csv', 'columnar']
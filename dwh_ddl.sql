@@ -42,7 +42,7 @@ CREATE TABLE wrk_otodom (
     , area REAL
     , etl_action VARCHAR
     , ds DATE
-)
+);
 
 
 -- create ETL tracker table to maintain proper order of loading
@@ -1,7 +1,9 @@
 # built-in
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import os
+import time
 
 # custom
 import config
@@ -15,14 +17,7 @@ def query_dwh(query, output=False):
     """
     Queries DWH. if `output` is True it will fetch all results and returns those.
     """
-    conn_settings = {
-        'user': 'slaw',
-        'host': 'localhost',
-        'dbname': 'postgres', 
-        'port': 5432,
-        'options': '-c search_path=dwh',  # schema
-    }
-    with psycopg2.connect(**conn_settings) as conn:
+    with psycopg2.connect(**config.DWH_CONN_SETTINGS) as conn:
         cur = conn.cursor()
         print(f'Executing:\n{query}')
         cur.execute(query)
@@ -49,7 +44,7 @@ def scrape_data(scrapers, ds):
             print(f'Data exists on disk for {s.scraper_id} and {ds}. No need to scrape.')
             continue
         else:
-            print('No data on disk')
+            print(f'[{s.scraper_id}] No data on disk')
         offers = s.scrape()
         print(f'[{s.scraper_id}] Got total {len(offers)} offers')
         s.store_offers(offers)
@@ -75,6 +70,10 @@ def load_to_stg(scrapers, ds):
             print(f'stg_{s.scraper_id} already loaded for {ds}. Skipping load.')
             continue
         file_name = s.get_full_file_name(ds)
+        if not os.path.exists(file_name):
+            # only columnar snapshot was stored
+            file_name = s.export_csv(ds)
+            print(f'Exported CSV ({file_name}) from columnar snapshot')
         query_dwh(f"""
             COPY stg_{s.scraper_id} FROM '{file_name}' (FORMAT csv);
 
@@ -93,12 +92,13 @@ def load_to_stg(scrapers, ds):
         print(f'Loaded file ({file_name}) into stg_{s.scraper_id}')
 
 
-def load_to_dwh(scrapers, ds):
+def load_to_dwh(scrapers, ds, run_query=query_dwh):
     """
-    Load data from staging into DWH offer tables
+    Load data from staging into DWH offer tables. `run_query` executes queries
+    (same signature as `query_dwh`), e.g. to profile the merge.
     """
     for s in scrapers:
-        max_dwh_load_ds = query_dwh(f"""
+        max_dwh_load_ds = run_query(f"""
             SELECT
                 MAX(ds) AS max_dwh_load_ds
             FROM
@@ -121,11 +121,65 @@ def load_to_dwh(scrapers, ds):
                 scraper_id = s.scraper_id,
                 ds = ds,
             )
-            query_dwh(sql_query)
+            run_query(sql_query)
         else:
             print(f'Not loading. ds ({ds}) should be older than {max_dwh_load_ds}')
 
 
+def scrape_and_stage(s, ds):
+    """
+    Runs whole pipeline of single scraper up to staging table
+    """
+    scrape_data([s], ds)
+    load_to_stg([s], ds)
+
+
+def run_etl(scrapers, ds):
+    """
+    Scrapes and loads into staging all scrapers concurrently (those do not share
+    rate limits, so total time is set by the slowest one). Then runs merges into
+    DWH one by one for scrapers which got staged. Returns status per scraper.
+    """
+    statuses = {s.scraper_id: {'stg': None, 'dwh': None, 'elapsed_s': None} for s in scrapers}
+
+    def run(s):
+        start = time.monotonic()
+        try:
+            scrape_and_stage(s, ds)
+        finally:
+            statuses[s.scraper_id]['elapsed_s'] = round(time.monotonic() - start, 1)
+
+    with ThreadPoolExecutor(max_workers=len(scrapers)) as executor:
+        futures = [(s, executor.submit(run, s)) for s in scrapers]
+    staged = []
+    for s, future in futures:
+        error = future.exception()
+        if error is None:
+            statuses[s.scraper_id]['stg'] = 'ok'
+            staged.append(s)
+        else:
+            statuses[s.scraper_id]['stg'] = f'failed: {error!r}'
+            otodom.logger.error(f'[{s.scraper_id}] Scrape/stage failed', exc_info=error)
+
+    for s in staged:
+        try:
+            load_to_dwh([s], ds)
+            statuses[s.scraper_id]['dwh'] = 'ok'
+        except Exception as error:
+            statuses[s.scraper_id]['dwh'] = f'failed: {error!r}'
+            otodom.logger.exception(f'[{s.scraper_id}] Load to DWH failed')
+    return statuses
+
+
+def print_summary(statuses, ds):
+    print(f'ETL summary for {ds}:')
+    for scraper_id, status in statuses.items():
+        print(
+            f'[{scraper_id}] stg: {status["stg"]}, dwh: {status["dwh"]}, '
+            f'scrape+stg time: {status["elapsed_s"]}s'
+        )
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-d', '--ds', action='store', dest='ds', help='Date in formar YYYY-MM-DD')
@@ -140,9 +194,11 @@ def main():
     logger = otodom.logger
 
     try:
-        scrape_data(scrapers, ds)
-        load_to_stg(scrapers, ds)
-        load_to_dwh(scrapers, ds)
+        statuses = run_etl(scrapers, ds)
+        print_summary(statuses, ds)
+        failed = [k for k, v in statuses.items() if v['dwh'] != 'ok']
+        if failed:
+            raise RuntimeError(f'ETL failed for: {failed}')
     except:
         # this will log full trackeback message
         logger.exception('Got exception on main handler!')
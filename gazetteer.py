@@ -0,0 +1,131 @@
+# built-in
+from collections import namedtuple
+import functools
+import json
+import os
+import re
+import sys
+import unicodedata
+
+
+Location = namedtuple(
+    'Location',
+    ['province', 'county', 'city', 'district', 'neighbourhood', 'city_slug'],
+)
+
+# bump when layout of stored entries changes
+FORMAT_VERSION = 1
+
+# polish letters which NFKD does not decompose into ascii + diacritic (e.g. 'ł')
+# are mapped explicitly. keep in sync with translate() in reports.sql
+_PL_ASCII = str.maketrans('ąćęłńóśźżĄĆĘŁŃÓŚŹŻ', 'acelnoszzACELNOSZZ')
+
+
+def slugify(name):
+    """
+    Normalize location name into ascii slug used in otodom urls, e.g.
+    'Zielona Góra' -> 'zielona-gora', 'Łódź' -> 'lodz'.
+    """
+    if name is None:
+        return None
+    name = name.translate(_PL_ASCII)
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r'[^a-z0-9]+', '-', name.lower())
+    return name.strip('-')
+
+
+def _intern(value):
+    return sys.intern(value) if value is not None else None
+
+
+class Gazetteer(object):
+    """
+    Persisted mapping of raw location string -> parsed `Location`.
+
+    There are only a few thousand distinct raw locations, so each one is parsed
+    once (by `parse_fn`) and kept in a dict which is stored as json between runs.
+    Lookups go through LRU cache first. All strings are interned and equal
+    locations share single tuple, so offers keep references instead of copies.
+
+    Stored file is discarded if it was written with different `parser_version`
+    (bump it whenever `parse_fn` changes) or FORMAT_VERSION.
+    """
+    def __init__(self, parse_fn, file_name=None, parser_version=1, cache_size=4096):
+        self.parse_fn = parse_fn
+        self.file_name = file_name
+        self.parser_version = parser_version
+        self._entries = {}
+        self._locations = {}
+        self._dirty = False
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self._lookup)
+        if file_name and os.path.exists(file_name):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, loc_raw):
+        return loc_raw in self._entries
+
+    def _lookup(self, loc_raw):
+        location = self._entries.get(loc_raw)
+        if location is None:
+            province, county, city, district, neighbourhood = self.parse_fn(loc_raw)
+            location = self._add(
+                loc_raw, (province, county, city, district, neighbourhood, slugify(city))
+            )
+            self._dirty = True
+        return location
+
+    def _add(self, loc_raw, values):
+        location = Location(*[_intern(v) for v in values])
+        # share single tuple between raw strings which resolve to same location
+        location = self._locations.setdefault(location, location)
+        self._entries[_intern(loc_raw)] = location
+        return location
+
+    def load(self):
+        """
+        Loads stored entries. Outdated or malformed file is ignored (and will be
+        overwritten on next `save`), so all locations get parsed again.
+        """
+        self.lookup.cache_clear()
+        try:
+            with open(self.file_name, 'r', encoding='utf8') as fh:
+                stored = json.load(fh)
+            if (
+                not isinstance(stored, dict)
+                or stored.get('format_version') != FORMAT_VERSION
+                or stored.get('parser_version') != self.parser_version
+            ):
+                raise ValueError('Outdated gazetteer file')
+            for loc_raw, values in stored['entries'].items():
+                if len(values) != len(Location._fields):
+                    raise ValueError(f'Malformed gazetteer entry: {loc_raw}')
+                self._add(loc_raw, values)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            self._entries = {}
+            self._locations = {}
+            self._dirty = True
+            return
+        self._dirty = False
+
+    def save(self):
+        """Stores gazetteer on disk. Does nothing if there are no new entries."""
+        if not self.file_name or not self._dirty:
+            return
+        tmp_file_name = f'{self.file_name}.tmp'
+        with open(tmp_file_name, 'w', encoding='utf8') as fh:
+            json.dump(
+                {
+                    'format_version': FORMAT_VERSION,
+                    'parser_version': self.parser_version,
+                    'entries': {k: list(v) for k, v in self._entries.items()},
+                },
+                fh,
+                ensure_ascii=False,
+                sort_keys=True,
+            )
+        os.replace(tmp_file_name, self.file_name)
+        self._dirty = False
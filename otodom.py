@@ -1,7 +1,9 @@
 # built in
+import collections
 import datetime
 import json
 import logging
+import os
 import random
 import re
 import sys
@@ -12,6 +14,7 @@ import requests
 import bs4
 
 # custom
+import gazetteer
 import scraper
 
 logger = logging.getLogger(__name__)
@@ -24,12 +27,23 @@ class OtoDom(scraper.Scraper):
     """
     https://www.otodom.pl/
     """
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
+    # bump whenever _parse_location changes, so stored gazetteer gets rebuilt
+    parse_location_version = 1
+
+    def __init__(self, base_url='https://www.otodom.pl', locations_file='./otodom_locations_urls.txt',
+                 sleep_range=(1, 2), max_retries=3, max_retry_wait=60, **kwargs):
+        super().__init__(request_interval=sleep_range, **kwargs)
         self.scraper_id = 'otodom'
-        self.base_sitemap = 'https://www.otodom.pl/sitemap.xml'  # is not updated frequently so better not to use
-        self.flat_rent_listing_url = 'https://www.otodom.pl/wynajem/mieszkanie/'
-        self.flat_sell_listing_url = 'https://www.otodom.pl/sprzedaz/mieszkanie/'
+        # base_url and locations_file can be changed e.g. to point to local stand-in server
+        self.base_url = base_url
+        self.locations_file = locations_file
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait  # upper bound of wait (e.g. from Retry-After) between retries
+        self.requests_stats = collections.Counter()  # no of responses per status code
+        self.listing_pages_count = 0  # no of listing pages offers were parsed from
+        self.base_sitemap = f'{base_url}/sitemap.xml'  # is not updated frequently so better not to use
+        self.flat_rent_listing_url = f'{base_url}/wynajem/mieszkanie/'
+        self.flat_sell_listing_url = f'{base_url}/sprzedaz/mieszkanie/'
         self.params = {
             'nrAdsPerPage': 72  # no of offers per page. 72 is max
         }
@@ -38,6 +52,11 @@ class OtoDom(scraper.Scraper):
             'lubin', 'poznan', 'szczecin', 'warszawa', 'wroclaw', 'gdynia',
             'zielona-gora', 'leszno', 'jelenia-gora', 'gdynia', 'swidnica'
         ])
+        self.gazetteer = gazetteer.Gazetteer(
+            self._parse_location,
+            os.path.join(self.file_path, f'{self.scraper_id}_gazetteer.json'),
+            parser_version=self.parse_location_version,
+        )
 
     def scrape(self, limit_pages=None, filter_cities=True):
         listings = self._get_all_listing()
@@ -57,31 +76,57 @@ class OtoDom(scraper.Scraper):
         counter = 0
         for idx, (listing, _type) in enumerate(listings_and_types):
             logger.debug(f'Process listing: {listing} [{idx+1}/{len(listings_and_types)}]')
-            for page_idx in range(1, self._get_no_pages(listing)+1):
+            try:
+                no_pages = self._get_no_pages(listing)
+            except requests.HTTPError as e:
+                logger.warning(f'Skipping listing {listing}: {e}')
+                continue
+            for page_idx in range(1, no_pages+1):
                 offers.extend(
                     self._get_offers(listing, _type, page_idx)
                 )
-                self._sleep()
                 counter += 1
                 if (limit_pages != None) and (counter >= limit_pages):
+                    self.gazetteer.save()
                     return self._dedup_offers(offers)
-        return self._dedup_offers(offers) 
+        self.gazetteer.save()
+        return self._dedup_offers(offers)
 
-    def _sleep(self):
-        """sleep for random (real) time between <start, stop>"""
-        time.sleep(random.uniform(1, 2))
+    def _get(self, url, params=None):
+        """
+        GET with retries on throttling (429) and server errors. Waits for
+        Retry-After if given, otherwise backs off linearly (bounded by
+        <0, max_retry_wait>). Every request goes through scraper's rate limiter.
+        Raises requests.HTTPError if response is still an error after retries.
+        """
+        for attempt in range(1, self.max_retries + 2):
+            with self.rate_limiter:
+                r = requests.get(
+                    url,
+                    headers=self.get_headers(),
+                    params=params
+                )
+            self.requests_stats[r.status_code] += 1
+            if (r.status_code != 429 and r.status_code < 500) or attempt > self.max_retries:
+                break
+            logger.debug(f'Got {r.status_code} from: {url}. Retry [{attempt}/{self.max_retries}]')
+            try:
+                wait = float(r.headers['Retry-After'])
+            except (KeyError, ValueError):
+                wait = self.rate_limiter.max_interval * attempt
+            time.sleep(min(max(wait, 0), self.max_retry_wait))
+        r.raise_for_status()
+        return r
 
     def _get_no_pages(self, listing_base):
-        r = requests.get(
-            listing_base,
-            headers=self.get_headers(),
-            params=self.params
-        )
+        r = self._get(listing_base, params=self.params)
         return int(re.findall('"page_count":"(\d+)"',  r.text)[0])
 
     def _parse_location(self, loc_raw):
         """
-        Parse raw location. There are following possibilities:
+        Parse raw location. Called once per distinct location, use
+        `self.gazetteer.lookup` to get (cached) parsed location.
+        There are following possibilities:
         1. Miasto, powiat, wojewodztwo
             - Ząbki, wołomiński, mazowieckie
             - Głuchołazy, nyski, opolskie 
@@ -121,11 +166,13 @@ class OtoDom(scraper.Scraper):
             params=dict(**self.params)
         else:
             params=dict(**self.params, page=page_idx)
-        r = requests.get(
-            listing,
-            headers=self.get_headers(),
-            params=params
-        )
+        try:
+            r = self._get(listing, params=params)
+        except requests.HTTPError as e:
+            # do not lose offers collected so far because of single page
+            logger.warning(f'No offers from: {listing}, page: {page_idx}: {e}')
+            return []
+        self.listing_pages_count += 1
         bs_obj = bs4.BeautifulSoup(r.text, features='lxml')
         tags = bs_obj.find_all(['article'])
         offers = []
@@ -143,7 +190,9 @@ class OtoDom(scraper.Scraper):
             elif listing_type in ('sell', 'sell_new'):
                 loc_pat =  r'Mieszkanie na sprzedaż: (.*)'
             offer_location_raw = re.findall(loc_pat, tag.find_all(['p'])[0].text)[0]
-            province, county, city, district, neighbourhood = self._parse_location(offer_location_raw)
+            province, county, city, district, neighbourhood, _ = self.gazetteer.lookup(
+                offer_location_raw
+            )
             offer_details_tag = tag.find_all('ul', {'class': 'params'})[0]
             details_tag_lis = offer_details_tag.find_all('li')
             try:
@@ -214,15 +263,15 @@ class OtoDom(scraper.Scraper):
         return [json.loads(s) for s in list_of_strings]
 
     def _url2loc(self, url):
-        url = url.replace('https://www.otodom.pl/sprzedaz/nowe-mieszkanie/' ,'')
-        url = url.replace('https://www.otodom.pl/sprzedaz/mieszkanie/' ,'')
-        url = url.replace('https://www.otodom.pl/wynajem/mieszkanie/' ,'')
+        url = url.replace(f'{self.base_url}/sprzedaz/nowe-mieszkanie/' ,'')
+        url = url.replace(f'{self.base_url}/sprzedaz/mieszkanie/' ,'')
+        url = url.replace(f'{self.base_url}/wynajem/mieszkanie/' ,'')
         url = url[:-1]
         return url
 
     def _get_all_listing(self):
         base_listings = set()
-        with open('./otodom_locations_urls.txt', 'r') as fh:
+        with open(self.locations_file, 'r') as fh:
             for line in fh.readlines():
                 base_listings.add(line.strip())
 
@@ -249,10 +298,11 @@ class OtoDom(scraper.Scraper):
         extended_listings = set()
         for idx, listing in enumerate(with_extra_locs):
             logger.debug(f'Getting extra listing from: {listing} [{idx+1}/{len(with_extra_locs)}]')
-            r = requests.get(
-                listing,
-                headers=self.get_headers(),
-            )
+            try:
+                r = self._get(listing)
+            except requests.HTTPError as e:
+                logger.warning(f'No extra listings from: {listing}: {e}')
+                continue
             bs_obj = bs4.BeautifulSoup(r.text, features='lxml')
             extra_links_section = bs_obj.find_all('div', {'id': 'locationLinks'})[0]
             extra_links = extra_links_section.find_all('a', href=True)
@@ -260,7 +310,6 @@ class OtoDom(scraper.Scraper):
                 _href = link['href']
                 if _href != '#':
                     extended_listings.add(_href)
-            self._sleep()
         all_listings = list(base_listings.union(extended_listings))
         return all_listings
 
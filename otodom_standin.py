@@ -0,0 +1,231 @@
+"""
+Local stand-in for otodom.pl. Serves generated listing pages with the markup
+parsed by OtoDom (offers, extra location links and "page_count"), so crawl
+can be run and measured offline. See bench_crawl.py
+"""
+# built-in
+import argparse
+import collections
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LISTING_PAT = re.compile(r'^/(wynajem/mieszkanie|sprzedaz/mieszkanie|sprzedaz/nowe-mieszkanie)/(.+?)/?$')
+CITY_NAMES = {
+    'bydgoszcz': 'Bydgoszcz', 'gdansk': 'Gdańsk', 'katowice': 'Katowice', 'krakow': 'Kraków',
+    'lodz': 'Łódź', 'lublin': 'Lublin', 'lubin': 'Lubin', 'poznan': 'Poznań', 'szczecin': 'Szczecin',
+    'warszawa': 'Warszawa', 'wroclaw': 'Wrocław', 'gdynia': 'Gdynia', 'zielona-gora': 'Zielona Góra',
+    'leszno': 'Leszno', 'jelenia-gora': 'Jelenia Góra', 'swidnica': 'Świdnica',
+}
+DISTRICTS = ['Centrum', 'Stare Miasto', 'Śródmieście', 'Wola', 'Podgórze', 'Psie Pole', 'Jeżyce']
+COUNTIES = [('wołomiński', 'mazowieckie'), ('nyski', 'opolskie'), ('poznański', 'wielkopolskie')]
+OFFER_TEMPLATE = """
+<article id="offer-item-ad_id{offer_id}" class="offer-item">
+  <header>
+    <h3><a href="{base}/oferta/{offer_id}.html"><span class="offer-item-title">{title}</span></a></h3>
+    <p class="text-nowrap">{location_prefix}: {location}</p>
+  </header>
+  <ul class="params">
+    {params}
+  </ul>
+  <div class="offer-item-details-bottom">
+    <ul>{bottom}</ul>
+  </div>
+</article>"""
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>{title}</title>
+<script>window.__data = {{"tracking":{{"page_count":"{page_count}","page":"{page}"}}}};</script>
+</head><body>
+<div class="listing">{offers}
+</div>
+<div id="locationLinks">
+  <a href="#">Pokaż więcej</a>{links}
+</div>
+</body></html>"""
+
+
+class StandInOptions(object):
+    def __init__(self, latency=0.0, page_count=5, offers_per_page=72, extra_links=5,
+                 error_rate=0.0, throttle_rate=0.0, retry_after=0, seed=0):
+        self.latency = latency
+        self.page_count = page_count
+        self.offers_per_page = offers_per_page
+        self.extra_links = extra_links
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.seed = seed
+
+
+def _price_text(rng, listing_type):
+    if listing_type == 'wynajem/mieszkanie':
+        return f'{rng.randint(1, 9)} {rng.randint(0, 999):03d} zł/mc'
+    return f'{rng.randint(150, 1999)} {rng.randint(0, 999):03d} zł'
+
+
+def _location(rng, loc):
+    slugs = loc.split('/')
+    city = CITY_NAMES.get(slugs[0], slugs[0].replace('-', ' ').title())
+    variant = rng.randint(0, 3)
+    if variant == 0:
+        county, province = rng.choice(COUNTIES)
+        return f'{city}, {county}, {province}'
+    elif variant == 1:
+        return f'{city}, {rng.choice(DISTRICTS)}, {rng.choice(DISTRICTS)}'
+    elif variant == 2:
+        return f'{city}, {rng.choice(DISTRICTS)}'
+    return f'{city}, {COUNTIES[0][1]}'
+
+
+def render_listing_page(base, listing_type, loc, page, options):
+    """Generates deterministic listing page for given listing and page no"""
+    rng = random.Random(zlib.crc32(f'{options.seed}/{listing_type}/{loc}/{page}'.encode()))
+    if listing_type == 'wynajem/mieszkanie':
+        location_prefix = 'Mieszkanie na wynajem'
+    else:
+        location_prefix = 'Mieszkanie na sprzedaż'
+    offers = []
+    for idx in range(options.offers_per_page):
+        no_rooms = rng.randint(1, 5)
+        area = f'{rng.randint(18, 140)},{rng.randint(0, 99):02d}'
+        params = [
+            f'<li>{no_rooms} {"pokój" if no_rooms == 1 else "pokoje"}</li>',
+            f'<li class="offer-item-price">{_price_text(rng, listing_type)}</li>',
+            f'<li>{area} m²</li>',
+        ]
+        roll = rng.random()
+        if roll < 0.02:
+            # rare offers without rooms info
+            params = params[1:]
+        elif roll < 0.04:
+            params[1] = '<li class="offer-item-price">Zapytaj o cenę</li>'
+        if rng.random() < 0.5:
+            bottom = '<li>Oferta prywatna</li>'
+        else:
+            bottom = f'<li>Oferta biura</li><li>Biuro {rng.randint(1, 300)}</li>'
+        offers.append(OFFER_TEMPLATE.format(
+            offer_id=f'{zlib.crc32(loc.encode()):x}{page:04d}{idx:03d}',
+            base=base,
+            title=f'Mieszkanie {no_rooms} pokojowe {rng.randint(1, 10**6)}',
+            location_prefix=location_prefix,
+            location=_location(rng, loc),
+            params='\n    '.join(params),
+            bottom=bottom,
+        ))
+    links = []
+    if '/' not in loc:
+        for idx in range(options.extra_links):
+            district = f'dzielnica-{idx}'
+            links.append(f'\n  <a href="{base}/{listing_type}/{loc}/{district}/">{district}</a>')
+    return PAGE_TEMPLATE.format(
+        title=f'{location_prefix} {loc}',
+        page_count=options.page_count,
+        page=page,
+        offers=''.join(offers),
+        links=''.join(links),
+    )
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # do not spam stderr with every request
+
+    def _send(self, status, body, content_type='text/html; charset=utf-8', headers=None, count=True):
+        data = body.encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+        if count:
+            self.server.count(status)
+
+    def do_GET(self):
+        options = self.server.options
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/__stats':
+            with self.server.lock:
+                stats = json.dumps(self.server.stats)
+            return self._send(200, stats, content_type='application/json', count=False)
+        time.sleep(options.latency)
+        with self.server.lock:
+            roll = self.server.rng.random()
+        if roll < options.throttle_rate:
+            return self._send(429, 'Too Many Requests', headers={'Retry-After': str(options.retry_after)})
+        elif roll < options.throttle_rate + options.error_rate:
+            return self._send(500, 'Internal Server Error')
+        match = LISTING_PAT.match(url.path)
+        if not match:
+            return self._send(404, 'Not Found')
+        query = urllib.parse.parse_qs(url.query)
+        page = int(query.get('page', ['1'])[0])
+        base = f'http://{self.headers["Host"]}'
+        self._send(200, render_listing_page(base, match[1], match[2], page, options))
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options):
+        super().__init__(address, StandInHandler)
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    def count(self, status):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats[str(status)] += 1
+
+
+def _serve(options, host, port, queue):
+    server = StandInServer((host, port), options)
+    queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_in_process(options, host='127.0.0.1', port=0):
+    """
+    Starts stand-in server in separate process (so it does not affect
+    measurements of the crawler). Returns (process, base_url).
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(options, host, port, queue), daemon=True)
+    process.start()
+    port = queue.get(timeout=10)
+    return process, f'http://{host}:{port}'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--page-count', type=int, default=5, help='No of pages per listing')
+    parser.add_argument('--offers-per-page', type=int, default=72)
+    parser.add_argument('--extra-links', type=int, default=5, help='No of extra location links per city listing')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 500 responses')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of 429 responses')
+    parser.add_argument('--retry-after', type=int, default=0, help='Retry-After sent with 429')
+    parser.add_argument('--seed', type=int, default=0)
+    args = vars(parser.parse_args())
+    host, port = args.pop('host'), args.pop('port')
+    server = StandInServer((host, port), StandInOptions(**args))
+    print(f'Serving otodom stand-in on http://{host}:{server.server_address[1]}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -21,8 +21,9 @@ WITH base AS (
     :MONTH BETWEEN EXTRACT(MONTH FROM offer_first_seen) AND EXTRACT(MONTH FROM offer_last_seen)
     -- now I need prices changes up to end of given month (changes can start earlier months though)
     AND EXTRACT(MONTH FROM price_start) <= :MONTH
-    AND city IN (
-      'bydgoszcz', 'gdańsk', 'katowice', 'kraków', 'lublin', 'lódź', 'poznań', 'szczecin', 'warszawa', 'wrocław'
+    -- compare on ascii slugs (same as gazetteer.slugify and OtoDom.selected_cities)
+    AND REPLACE(TRANSLATE(LOWER(city), 'ąćęłńóśźż', 'acelnoszz'), ' ', '-') IN (
+      'bydgoszcz', 'gdansk', 'katowice', 'krakow', 'lublin', 'lodz', 'poznan', 'szczecin', 'warszawa', 'wroclaw'
     )
     -- look at rent only
     AND offer_type = 'rent'
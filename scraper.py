@@ -5,8 +5,11 @@ import datetime
 import json
 import os
 import random
+import threading
+import time
 
 # custom
+import columnar
 import user_agents
 import config
 
@@ -19,16 +22,52 @@ class InconsistentScraperSchema(Exception):
     pass
 
 
+class RateLimiter(object):
+    """
+    Keeps random gap of <min_interval, max_interval> seconds between end of
+    one request and start of the next one. Use as context manager around
+    request (or call `wait` before and `done` after it). Thread safe.
+    """
+    def __init__(self, min_interval, max_interval=None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval if max_interval is not None else min_interval
+        self._last = None
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            if self._last is not None:
+                interval = random.uniform(self.min_interval, self.max_interval)
+                to_sleep = self._last + interval - time.monotonic()
+                if to_sleep > 0:
+                    time.sleep(to_sleep)
+
+    def done(self):
+        """Marks end of request. Next `wait` counts the gap from now"""
+        with self._lock:
+            self._last = time.monotonic()
+
+    def __enter__(self):
+        self.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self.done()
+
+
 class Scraper(metaclass=ABCMeta):
     """
     Base class for all scrapers
     """
-    def __init__(self, ds=None):
+    def __init__(self, ds=None, file_path=None, request_interval=(1, 2)):
         self.headers = {
             'Accept':'application/json, text/plain, */*',
             'Connection':'keep-alive',
         }
-        self.file_path = config.OFFERS_FILE_PATH
+        self.file_path = file_path or config.OFFERS_FILE_PATH
+        # each scraper (portal) has its own limit as those do not share it
+        self.rate_limiter = RateLimiter(*request_interval)
+        self.storage_formats = config.OFFERS_STORAGE_FORMATS
         # order of schema matters. make sure it refers to stg table
         self.schema = [
             ('offer_source_id', 'varchar'),
@@ -64,7 +103,18 @@ class Scraper(metaclass=ABCMeta):
 
     def store_offers(self, offers):
         self._check_schema(offers)
-        full_file_name = self.get_full_file_name(self.ds)
+        if 'csv' in self.storage_formats:
+            self._write_csv(self.get_full_file_name(self.ds), offers)
+        if 'columnar' in self.storage_formats:
+            columnar.write_snapshot(
+                self.get_columnar_dir_name(self.ds),
+                self.schema,
+                offers,
+                meta={'ds': self.ds, 'scraper_id': self.scraper_id},
+            )
+
+    def _write_csv(self, full_file_name, offers, ds=None):
+        ds = ds or self.ds
         with open(full_file_name, 'w', encoding='utf8') as fh:
             writer = csv.writer(fh)
             for offer in offers:
@@ -72,13 +122,32 @@ class Scraper(metaclass=ABCMeta):
                     str(offer.get(k,'')) if offer.get(k,'') != None else ''
                     for k in self.filed_names
                 ]
-                row = [self.ds, self.scraper_id] + row
+                row = [ds, self.scraper_id] + row
                 writer.writerow(row)
 
-    def check_file_for_ds(self, ds):
+    def export_csv(self, ds):
+        """
+        Writes CSV (e.g. for loading into stg) for `ds` out of columnar snapshot.
+        Returns full file name.
+        """
         full_file_name = self.get_full_file_name(ds)
-        if os.path.exists(full_file_name):
-            return True
+        self._write_csv(
+            full_file_name,
+            columnar.iter_rows(self.get_columnar_dir_name(ds)),
+            ds=ds,
+        )
+        return full_file_name
+
+    def read_offers(self, ds, columns=None, use_mmap=True):
+        """Reads selected columns of columnar snapshot for `ds`"""
+        return columnar.read_snapshot(
+            self.get_columnar_dir_name(ds), columns, use_mmap
+        )
+
+    def check_file_for_ds(self, ds):
+        for path in (self.get_full_file_name(ds), self.get_columnar_dir_name(ds)):
+            if os.path.exists(path):
+                return True
         return False
 
     def get_full_file_name(self, ds):
@@ -88,6 +157,13 @@ class Scraper(metaclass=ABCMeta):
             f'{self.scraper_id}_{ds}.csv'
         )
 
+    def get_columnar_dir_name(self, ds):
+        ds = ds.replace('-', '_')
+        return os.path.join(
+            self.file_path,
+            f'{self.scraper_id}_{ds}.col'
+        )
+
     def _check_schema(self, offers):
         schemas = []
         for offer in offers: